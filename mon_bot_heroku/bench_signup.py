@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+# Banc d'essai des inscriptions - Discord simulé et base de données locale
+#
+# Utilisation :
+#   python bench_signup.py                     # base en mémoire (stand-in local)
+#   python bench_signup.py --postgres          # vraie base locale (variables SUPABASE_DB_*)
+#   python bench_signup.py --discord-latency-ms 50 --db-latency-ms 5 > bench_output.txt
+#   python bench_signup.py --startup           # temps de démarrage et appels Discord de on_ready
+
+# ===================================================================================
+# --- 1. IMPORTS ET ENVIRONNEMENT MINIMAL
+# ===================================================================================
+import os
+import sys
+import time
+import asyncio
+import argparse
+from collections import Counter
+from types import SimpleNamespace
+
+# mon_bot.py s'arrête au chargement si la configuration est absente : on fournit des valeurs factices.
+BENCH_GUILD_ID = 900000000000000001
+BENCH_ENV = {
+    "DISCORD_BOT_TOKEN": "bench-token",
+    "DISCORD_GUILD_ID": str(BENCH_GUILD_ID),
+    "ADMIN_PANEL_CHANNEL_ID": "900000000000000010",
+    "LINK_PANEL_CHANNEL_ID": "900000000000000011",
+    "RESULTS_CHANNEL_ID": "900000000000000012",
+    "SOLO_ANNOUNCE_ID": "900000000000000020",
+    "DUO_ANNOUNCE_ID": "900000000000000021",
+    "TRIO_ANNOUNCE_ID": "900000000000000022",
+}
+for _key, _value in BENCH_ENV.items():
+    os.environ.setdefault(_key, _value)
+
+import discord
+_import_started_at = time.perf_counter()
+import mon_bot
+MON_BOT_IMPORT_SECONDS = time.perf_counter() - _import_started_at
+from database import DatabaseManager
+from game_state import GAME_STATE_BACKENDS, create_game_state_store
+
+BENCH_BOT_USER_ID = 900000000000000002
+BENCH_CREATOR_ID = 900000000000000003
+BENCH_PLAYER_BASE_ID = 910000000000000000
+BENCH_MESSAGE_BASE_ID = 920000000000000000
+
+# Compteurs globaux des appels simulés ('db' = allers-retours base, 'discord' = appels HTTP Discord)
+calls = Counter()
+
+# ===================================================================================
+# --- 2. COUCHE HTTP DISCORD SIMULÉE
+# ===================================================================================
+class FakeDiscordHTTP:
+    """Simule la latence de l'API Discord et compte chaque appel."""
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+
+    async def call(self, route: str):
+        calls['discord'] += 1
+        calls[f'discord:{route}'] += 1
+        if self.latency: await asyncio.sleep(self.latency)
+
+class FakeUser:
+    def __init__(self, http: FakeDiscordHTTP, user_id: int, name: str):
+        self.http = http
+        self.id = user_id
+        self.name = name
+        self.bot = False
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    async def send(self, content=None, **kwargs):
+        await self.http.call('dm_send')
+
+class FakeMessage:
+    def __init__(self, http: FakeDiscordHTTP, message_id: int, channel, embed: discord.Embed = None, author=None, view=None):
+        self.http = http
+        self.id = message_id
+        self.channel = channel
+        self.author = author
+        self.embeds = [embed] if embed else []
+        self.components = [SimpleNamespace(children=list(view.children))] if view else []
+
+    async def edit(self, **kwargs):
+        await self.http.call('message_edit')
+        if kwargs.get('embed'): self.embeds = [kwargs['embed']]
+        if kwargs.get('view'): self.components = [SimpleNamespace(children=list(kwargs['view'].children))]
+
+    async def delete(self):
+        await self.http.call('message_delete')
+        self.channel.messages.pop(self.id, None)
+
+    async def add_reaction(self, emoji):
+        await self.http.call('reaction_add')
+
+    async def remove_reaction(self, emoji, member):
+        await self.http.call('reaction_remove')
+
+class FakeChannel:
+    def __init__(self, http: FakeDiscordHTTP, channel_id: int, name: str):
+        self.http = http
+        self.id = channel_id
+        self.name = name
+        self.messages = {}
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def fetch_message(self, message_id: int):
+        await self.http.call('message_fetch')
+        if message_id not in self.messages: raise KeyError(message_id)
+        return self.messages[message_id]
+
+    async def send(self, content=None, **kwargs):
+        await self.http.call('message_send')
+        self.sent_count = getattr(self, 'sent_count', 0) + 1
+        message = FakeMessage(self.http, BENCH_MESSAGE_BASE_ID + self.id % 1000 * 100000 + self.sent_count, self, kwargs.get('embed'), mon_bot.bot.user, kwargs.get('view'))
+        self.messages[message.id] = message
+        return message
+
+    def get_partial_message(self, message_id: int):
+        return self.messages.get(message_id) or FakeMessage(self.http, message_id, self)
+
+    async def history(self, limit: int = 100):
+        await self.http.call('message_history')
+        for message in list(reversed(self.messages.values()))[:limit]:
+            yield message
+
+    async def purge(self, limit: int = 100, check=None):
+        await self.http.call('message_history')
+        to_delete = [m for m in list(reversed(self.messages.values()))[:limit] if not check or check(m)]
+        if to_delete: await self.http.call('message_bulk_delete')
+        for message in to_delete: self.messages.pop(message.id, None)
+        return to_delete
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = "Serveur de bench"
+        self.members = {}
+        self.channels = {}
+
+    def get_member(self, member_id: int):
+        return self.members.get(member_id)
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+# ===================================================================================
+# --- 3. BASES DE DONNÉES (STAND-IN EN MÉMOIRE OU POSTGRES LOCAL)
+# ===================================================================================
+class InMemoryDatabaseManager:
+    """Remplaçant en mémoire de DatabaseManager : mêmes méthodes, un aller-retour compté par appel."""
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.players = {}
+        self.games = {}
+        self.participants = {}
+
+    async def _round_trip(self):
+        calls['db'] += 1
+        if self.latency: await asyncio.sleep(self.latency)
+
+    async def connect(self):
+        return True
+
+    async def get_guild_configs(self) -> list[dict]:
+        await self._round_trip()
+        return []
+
+    async def upsert_guild_config(self, guild_id: int, data: dict):
+        await self._round_trip()
+
+    async def get_player(self, discord_id: int) -> dict | None:
+        await self._round_trip()
+        player = self.players.get(discord_id)
+        return dict(player) if player else None
+
+    async def upsert_player(self, discord_id: int, data: dict):
+        await self._round_trip()
+        self.players.setdefault(discord_id, {'discord_id': discord_id, 'is_creator': False}).update(data)
+
+    async def get_game(self, guild_id: int, game_code: str) -> dict | None:
+        await self._round_trip()
+        game = self.games.get((guild_id, game_code))
+        return dict(game) if game else None
+
+    async def create_game(self, **data) -> bool:
+        await self._round_trip()
+        game_key = (data['guild_id'], data['game_code'])
+        if game_key in self.games: return False
+        self.games[game_key] = dict(data)
+        self.participants.setdefault(game_key, {})
+        return True
+
+    async def update_game_status(self, guild_id: int, game_code: str, status: str, winner_names: list = None):
+        await self._round_trip()
+        if (guild_id, game_code) in self.games: self.games[(guild_id, game_code)]['status'] = status
+
+    async def archive_finished_games(self, older_than_days: int, batch_size: int) -> int:
+        await self._round_trip()
+        return 0
+
+    async def add_participant(self, guild_id: int, game_code: str, user_id: int) -> bool:
+        await self._round_trip()
+        self.participants.setdefault((guild_id, game_code), {}).setdefault(user_id, {'has_won_game': False})
+        return True
+
+    async def remove_participant(self, guild_id: int, game_code: str, user_id: int):
+        await self._round_trip()
+        self.participants.get((guild_id, game_code), {}).pop(user_id, None)
+
+    async def get_game_participants(self, guild_id: int, game_code: str) -> list[dict]:
+        await self._round_trip()
+        return [
+            {'discord_id': user_id, 'epic_name': self.players.get(user_id, {}).get('epic_name'), 'has_won_game': row['has_won_game']}
+            for user_id, row in self.participants.get((guild_id, game_code), {}).items()
+        ]
+
+    async def cleanup(self):
+        pass
+
+class CountingDatabaseManager(DatabaseManager):
+    """DatabaseManager réel (base Postgres locale) dont chaque requête est comptée."""
+    async def _execute_query(self, query: str, params: tuple = None, **kwargs):
+        calls['db'] += 1
+        return await super()._execute_query(query, params, **kwargs)
+
+    async def cleanup(self):
+        await super()._execute_query("DELETE FROM games WHERE guild_id = %s", (BENCH_GUILD_ID,))
+        await super()._execute_query("DELETE FROM guild_configs WHERE guild_id = %s", (BENCH_GUILD_ID,))
+        await super()._execute_query("DELETE FROM players WHERE discord_id >= %s", (BENCH_PLAYER_BASE_ID,))
+
+# ===================================================================================
+# --- 4. SCÉNARIOS
+# ===================================================================================
+# (mode, joueurs, joueurs qui enchaînent retrait/ajout/retrait après leur inscription)
+SCENARIOS = {
+    "solo-100": [("SOLO", 100, 0)],
+    "duo-50": [("DUO", 50, 0)],
+    "concurrent": [("SOLO", 100, 0), ("DUO", 50, 0), ("TRIO", 33, 0)],
+    "flapping": [("SOLO", 100, 20)],
+    # Plus de joueurs que de places : 50 réactions simultanées doivent être refusées sans dépasser la limite
+    "oversubscribed": [("SOLO", 150, 0)],
+}
+
+def make_payload(message_id: int, channel_id: int, user_id: int, emoji: str = '✅', event_type: str = 'REACTION_ADD') -> discord.RawReactionActionEvent:
+    data = {
+        'message_id': message_id, 'channel_id': channel_id, 'user_id': user_id,
+        'guild_id': BENCH_GUILD_ID, 'burst': False, 'burst_colors': [], 'type': 0,
+    }
+    return discord.RawReactionActionEvent(data, discord.PartialEmoji(name=emoji), event_type)
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values: return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+async def timed_handlers(payloads: list[discord.RawReactionActionEvent], latencies: list[float]):
+    """Rejoue dans l'ordre les réactions d'un même joueur, en chronométrant chaque appel au handler."""
+    for payload in payloads:
+        handler = mon_bot.on_raw_reaction_add if payload.event_type == 'REACTION_ADD' else mon_bot.on_raw_reaction_remove
+        start = time.perf_counter()
+        try:
+            await handler(payload)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+async def run_scenario(name: str, games: list[tuple[str, int, int]], db, http: FakeDiscordHTTP, state_backend: str) -> dict:
+    guild = FakeGuild(BENCH_GUILD_ID)
+    link_channel_id = mon_bot.ENV_GUILD_CONFIG['link_panel_channel_id']
+    guild.channels[link_channel_id] = FakeChannel(http, link_channel_id, "liaison")
+    mon_bot.bot.get_guild = lambda guild_id: guild if guild_id == BENCH_GUILD_ID else None
+    mon_bot.bot.get_channel = guild.get_channel
+    mon_bot.bot.db_manager = db
+    mon_bot.bot.game_store = create_game_state_store(state_backend, db)
+    mon_bot.announce_update_tasks.clear()
+    mon_bot.pending_leaves.clear()
+
+    await db.upsert_player(BENCH_CREATOR_ID, {'epic_name': 'bench-creator', 'is_creator': True})
+    sequences, limits, expected = [], {}, {}
+    player_id = BENCH_PLAYER_BASE_ID
+    for index, (mode, players, flappers) in enumerate(games):
+        details = mon_bot.mode_channels_for(BENCH_GUILD_ID)[mode]
+        channel = guild.channels.setdefault(details['announce_id'], FakeChannel(http, details['announce_id'], mode.lower()))
+        embed = discord.Embed(title=f"Nouvelle Partie [{mode}]")
+        embed.add_field(name="Lancée par", value=f"<@{BENCH_CREATOR_ID}>", inline=False)
+        embed.add_field(name="Comment participer ?", value=f"Limite: {details['limit']}", inline=False)
+        ann_msg = FakeMessage(http, BENCH_MESSAGE_BASE_ID + index, channel, embed)
+        channel.messages[ann_msg.id] = ann_msg
+
+        game_code = f"bench-{name}-{mode.lower()}-{index}"
+        game_data = {'game_code': game_code, 'guild_id': BENCH_GUILD_ID, 'mode': mode, 'creator_id': BENCH_CREATOR_ID, 'announce_message_id': ann_msg.id, 'announce_channel_id': channel.id, 'status': 'pending', 'limit': details['limit']}
+        await db.create_game(**game_data)
+        await mon_bot.bot.game_store.add_game(game_data)
+        limits[(BENCH_GUILD_ID, game_code)] = details['limit']
+        # Les joueurs qui enchaînent retrait/ajout/retrait finissent désinscrits
+        expected[(BENCH_GUILD_ID, game_code)] = min(players - flappers, details['limit'])
+
+        for player_index in range(players):
+            guild.members[player_id] = FakeUser(http, player_id, f"joueur{player_id - BENCH_PLAYER_BASE_ID}")
+            await db.upsert_player(player_id, {'epic_name': f"epic-{player_id - BENCH_PLAYER_BASE_ID}"})
+            sequence = [make_payload(ann_msg.id, channel.id, player_id)]
+            if player_index < flappers:
+                sequence += [make_payload(ann_msg.id, channel.id, player_id, event_type=event_type) for event_type in ('REACTION_REMOVE', 'REACTION_ADD', 'REACTION_REMOVE')]
+            sequences.append(sequence)
+            player_id += 1
+
+    # La mise en place n'est pas mesurée
+    calls.clear()
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed_handlers(s, latencies) for s in sequences), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    # Départs différés puis éditions d'annonce regroupées partent après la rafale : on les compte sans les chronométrer
+    await asyncio.gather(*mon_bot.pending_leaves.values(), return_exceptions=True)
+    await asyncio.gather(*mon_bot.announce_update_tasks.values(), return_exceptions=True)
+    db_calls, discord_calls = calls['db'], calls['discord']
+    errors = [r for r in results if isinstance(r, Exception)]
+
+    joins, overfill, mismatches = 0, 0, 0
+    for game_key, limit in limits.items():
+        registered = len(await db.get_game_participants(*game_key))
+        joins += registered
+        overfill += max(0, registered - limit)
+        mismatches += registered != expected[game_key]
+
+    await db.cleanup()
+    return {
+        'scenario': name, 'reactions': len(latencies), 'joins': joins, 'expected_joins': sum(expected.values()), 'errors': len(errors),
+        'overfill': overfill, 'mismatches': mismatches, 'refused': calls['discord:reaction_remove'], 'elapsed': elapsed,
+        'joins_per_sec': joins / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000, 'p99_ms': percentile(latencies, 99) * 1000,
+        'db_per_join': db_calls / joins if joins else float(db_calls),
+        'discord_per_join': discord_calls / joins if joins else float(discord_calls),
+        'embed_edits': calls['discord:message_edit'],
+        'first_error': repr(errors[0]) if errors else '',
+    }
+
+async def run_startup(db, http: FakeDiscordHTTP, state_backend: str) -> list[dict]:
+    """Exécute on_ready à froid (salons vides) puis à chaud (panneaux déjà présents, cas d'un redémarrage)."""
+    guild = FakeGuild(BENCH_GUILD_ID)
+    for config_key, channel_name in (('admin_panel_channel_id', "admin"), ('link_panel_channel_id', "liaison")):
+        channel_id = mon_bot.ENV_GUILD_CONFIG[config_key]
+        guild.channels[channel_id] = FakeChannel(http, channel_id, channel_name)
+    mon_bot.bot.get_guild = lambda guild_id: guild if guild_id == BENCH_GUILD_ID else None
+    mon_bot.bot.get_channel = guild.get_channel
+    mon_bot.bot.db_manager = db
+    mon_bot.bot.game_store = create_game_state_store(state_backend, db)
+
+    rows = []
+    for phase in ("froid", "redémarrage"):
+        calls.clear()
+        mon_bot.bot.startup_done = False # Chaque phase simule un nouveau processus
+        await mon_bot.on_ready()
+        rows.append({'phase': phase, 'report': dict(mon_bot.bot.startup_report), 'discord_calls': calls['discord'], 'db_calls': calls['db']})
+    return rows
+
+def print_startup_report(rows: list[dict], args: argparse.Namespace):
+    print(f"Démarrage du bot - import de mon_bot: {MON_BOT_IMPORT_SECONDS * 1000:.1f} ms, latence Discord: {args.discord_latency_ms} ms")
+    for r in rows:
+        steps = ", ".join(f"{step} {duration * 1000:.1f} ms" for step, duration in r['report'].items() if step not in ('avant on_ready', 'total'))
+        print(f"{r['phase']:<12} appels Discord: {r['discord_calls']:>3}  requêtes DB: {r['db_calls']:>3}  {steps}")
+
+def print_report(rows: list[dict], args: argparse.Namespace):
+    backend = "postgres local" if args.postgres else "mémoire"
+    print(f"Banc d'essai des inscriptions - base: {backend}, état: {args.state_backend}, latence DB: {args.db_latency_ms} ms, latence Discord: {args.discord_latency_ms} ms")
+    print(f"{'scénario':<14} {'réactions':>9} {'inscrits':>8} {'attendus':>8} {'refusés':>7} {'erreurs':>7} {'dépass.':>7} {'joins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'DB/join':>8} {'API/join':>8} {'éditions':>8}")
+    for r in rows:
+        print(f"{r['scenario']:<14} {r['reactions']:>9} {r['joins']:>8} {r['expected_joins']:>8} {r['refused']:>7} {r['errors']:>7} {r['overfill']:>7} {r['joins_per_sec']:>9.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['db_per_join']:>8.2f} {r['discord_per_join']:>8.2f} {r['embed_edits']:>8}")
+        if r['first_error']: print(f"  ↳ première erreur: {r['first_error']}")
+        if r['mismatches']: print(f"  ↳ {r['mismatches']} partie(s) dont le nombre d'inscrits diffère de l'attendu")
+
+async def main(args: argparse.Namespace):
+    http = FakeDiscordHTTP(args.discord_latency_ms)
+    if args.state_backend == "postgres" and not args.postgres:
+        print("❌ Le backend d'état postgres nécessite --postgres.", file=sys.stderr)
+        return 1
+    db = CountingDatabaseManager() if args.postgres else InMemoryDatabaseManager(args.db_latency_ms)
+    if args.postgres and not await db.connect():
+        print("❌ Connexion à la base Postgres locale impossible (vérifiez SUPABASE_DB_*).", file=sys.stderr)
+        return 1
+
+    mon_bot.bot._connection.user = FakeUser(http, BENCH_BOT_USER_ID, "bench-bot")
+    if args.startup:
+        print_startup_report(await run_startup(db, http, args.state_backend), args)
+        return 0
+
+    names = args.scenario or list(SCENARIOS)
+    rows = [await run_scenario(name, SCENARIOS[name], db, http, args.state_backend) for name in names]
+    print_report(rows, args)
+    # Un nombre d'inscrits différent de l'attendu (limite dépassée ou inscriptions perdues) fait échouer le banc
+    return 1 if any(r['errors'] or r['mismatches'] for r in rows) else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesure le débit des inscriptions par réaction (on_raw_reaction_add / on_raw_reaction_remove).")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Scénario à exécuter (répétable, tous par défaut).")
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="Latence simulée par aller-retour base (mode mémoire).")
+    parser.add_argument("--discord-latency-ms", type=float, default=20.0, help="Latence simulée par appel à l'API Discord.")
+    parser.add_argument("--postgres", action="store_true", help="Utiliser une vraie base Postgres locale via DatabaseManager.")
+    parser.add_argument("--state-backend", choices=list(GAME_STATE_BACKENDS), default="memory", help="Backend d'état des parties actives (postgres nécessite --postgres).")
+    parser.add_argument("--startup", action="store_true", help="Mesurer le démarrage (on_ready) au lieu des inscriptions.")
+    sys.exit(asyncio.run(main(parser.parse_args())))
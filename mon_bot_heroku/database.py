@@ -18,6 +18,8 @@ class DatabaseManager:
         self.db_name = os.environ.get("SUPABASE_DB_NAME")
         self.db_user = os.environ.get("SUPABASE_DB_USER")
         self.db_password = os.environ.get("SUPABASE_DB_PASSWORD")
+        # Serveur historique : les données antérieures au multi-serveur lui sont rattachées lors des migrations
+        self.legacy_guild_id = int(os.environ.get("DISCORD_GUILD_ID", 0))
         self.conn = None
         self.logger = logging.getLogger('database_manager')
         if not self.logger.handlers:
@@ -51,15 +53,17 @@ class DatabaseManager:
             self.conn = None
             return False
 
-    async def _execute_query(self, query: str, params: tuple = None, fetch_one: bool = False, fetch_all: bool = False):
-        """Exécute une requête SQL de manière sécurisée."""
+    async def _execute_query(self, query: str, params: tuple = None, fetch_one: bool = False, fetch_all: bool = False, commit: bool = False):
+        """Exécute une requête SQL de manière sécurisée. `commit` valide aussi les requêtes qui renvoient des lignes (RETURNING)."""
         if not await self.connect():
             return None if fetch_one else [] if fetch_all else False
         try:
             with self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
                 await asyncio.to_thread(cur.execute, query, params)
-                if fetch_one: return await asyncio.to_thread(cur.fetchone)
-                if fetch_all: return await asyncio.to_thread(cur.fetchall)
+                if fetch_one or fetch_all:
+                    result = await asyncio.to_thread(cur.fetchone if fetch_one else cur.fetchall)
+                    if commit: await asyncio.to_thread(self.conn.commit)
+                    return result
                 await asyncio.to_thread(self.conn.commit)
                 return True
         except Exception as e:
@@ -86,24 +90,52 @@ class DatabaseManager:
         # Table des parties
         await self._execute_query("""
             CREATE TABLE IF NOT EXISTS games (
-                game_code TEXT PRIMARY KEY, creator_id BIGINT NOT NULL, mode TEXT NOT NULL,
+                game_code TEXT NOT NULL, guild_id BIGINT NOT NULL, creator_id BIGINT NOT NULL, mode TEXT NOT NULL,
                 announce_message_id BIGINT, announce_channel_id BIGINT, status TEXT NOT NULL, 
-                limit INTEGER, winner_epic_names JSONB,
+                "limit" INTEGER, winner_epic_names JSONB,
                 created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                end_time TIMESTAMP WITH TIME ZONE
+                end_time TIMESTAMP WITH TIME ZONE,
+                PRIMARY KEY (guild_id, game_code)
             )
         """)
+        # update_game_status met à jour cette colonne, absente des premières versions de la table
+        await self._execute_query("ALTER TABLE games ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()")
+        await self._execute_query("ALTER TABLE games ADD COLUMN IF NOT EXISTS guild_id BIGINT")
+        await self._execute_query("CREATE INDEX IF NOT EXISTS idx_games_status_created_at ON games (status, created_at)")
         
         # Table de participation (lien entre joueurs et parties)
         await self._execute_query("""
             CREATE TABLE IF NOT EXISTS game_participants (
-                id SERIAL PRIMARY KEY, game_code TEXT NOT NULL, user_id BIGINT NOT NULL, 
+                id SERIAL PRIMARY KEY, guild_id BIGINT NOT NULL, game_code TEXT NOT NULL, user_id BIGINT NOT NULL, 
                 has_won_game BOOLEAN DEFAULT FALSE,
-                FOREIGN KEY (game_code) REFERENCES games(game_code) ON DELETE CASCADE,
+                FOREIGN KEY (guild_id, game_code) REFERENCES games(guild_id, game_code) ON DELETE CASCADE,
                 FOREIGN KEY (user_id) REFERENCES players(discord_id) ON DELETE CASCADE,
-                UNIQUE (game_code, user_id)
+                UNIQUE (guild_id, game_code, user_id)
             )
         """)
+        await self._execute_query("ALTER TABLE game_participants ADD COLUMN IF NOT EXISTS guild_id BIGINT")
+        await self._execute_query("CREATE INDEX IF NOT EXISTS idx_game_participants_user_id ON game_participants (user_id)")
+        await self.migrate_games_guild_key()
+
+        # Tables d'archive : parties terminées/annulées déplacées hors des tables actives par la rétention
+        await self._execute_query("""
+            CREATE TABLE IF NOT EXISTS games_archive (
+                id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY, game_code TEXT NOT NULL, guild_id BIGINT, creator_id BIGINT NOT NULL, mode TEXT NOT NULL,
+                status TEXT NOT NULL, winner_epic_names JSONB, participant_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP WITH TIME ZONE, end_time TIMESTAMP WITH TIME ZONE,
+                archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            )
+        """)
+        await self._execute_query("""
+            CREATE TABLE IF NOT EXISTS game_participants_archive (
+                archive_id BIGINT NOT NULL REFERENCES games_archive(id) ON DELETE CASCADE,
+                user_id BIGINT NOT NULL, has_won_game BOOLEAN DEFAULT FALSE,
+                PRIMARY KEY (archive_id, user_id)
+            )
+        """)
+        # Un code peut être réutilisé après archivage : plusieurs lignes d'archive peuvent donc partager le même code
+        await self._execute_query("CREATE INDEX IF NOT EXISTS idx_games_archive_game_code ON games_archive (game_code)")
+        await self._execute_query("CREATE INDEX IF NOT EXISTS idx_game_participants_archive_user_id ON game_participants_archive (user_id)")
 
         # Table des sanctions
         await self._execute_query("""
@@ -114,8 +146,81 @@ class DatabaseManager:
                 created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
             )
         """)
+        await self._execute_query("ALTER TABLE sanctions ADD COLUMN IF NOT EXISTS guild_id BIGINT")
+        if self.legacy_guild_id:
+            await self._execute_query("UPDATE sanctions SET guild_id = %s WHERE guild_id IS NULL", (self.legacy_guild_id,))
+
+        # Créateurs de parties, par serveur
+        creators_table = await self._execute_query("SELECT to_regclass('public.guild_creators')", fetch_one=True)
+        await self._execute_query("""
+            CREATE TABLE IF NOT EXISTS guild_creators (
+                guild_id BIGINT NOT NULL, user_id BIGINT NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                PRIMARY KEY (guild_id, user_id)
+            )
+        """)
+        if creators_table and creators_table[0] is None and self.legacy_guild_id:
+            # Première création : l'ancien drapeau global players.is_creator valait pour le serveur historique
+            await self._execute_query("INSERT INTO guild_creators (guild_id, user_id) SELECT %s, discord_id FROM players WHERE is_creator ON CONFLICT DO NOTHING", (self.legacy_guild_id,))
+
+        # Table de configuration par serveur Discord
+        await self._execute_query("""
+            CREATE TABLE IF NOT EXISTS guild_configs (
+                guild_id BIGINT PRIMARY KEY, admin_panel_channel_id BIGINT, link_panel_channel_id BIGINT,
+                results_channel_id BIGINT, solo_announce_id BIGINT, duo_announce_id BIGINT, trio_announce_id BIGINT,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            )
+        """)
         self.logger.info("Toutes les tables ont été vérifiées/créées.")
 
+    async def migrate_games_guild_key(self):
+        """Passe la clé des parties de game_code seul à (guild_id, game_code). Sans effet une fois la migration appliquée."""
+        migrated = await self._execute_query("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_index i JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                WHERE i.indrelid = 'public.games'::regclass AND i.indisprimary AND a.attname = 'guild_id'
+            )
+        """, fetch_one=True)
+        if not migrated or migrated[0]: return
+        # Parties antérieures au multi-serveur : rattachées au serveur historique, leur code reste inchangé.
+        # Une seule transaction : en cas d'échec, l'ancienne clé est conservée et la migration sera retentée.
+        query = """
+            UPDATE games SET guild_id = %s WHERE guild_id IS NULL;
+            UPDATE game_participants gp SET guild_id = g.guild_id FROM games g WHERE gp.game_code = g.game_code AND gp.guild_id IS NULL;
+            ALTER TABLE game_participants DROP CONSTRAINT IF EXISTS game_participants_game_code_fkey;
+            ALTER TABLE game_participants DROP CONSTRAINT IF EXISTS game_participants_game_code_user_id_key;
+            ALTER TABLE games DROP CONSTRAINT IF EXISTS games_pkey;
+            ALTER TABLE games ALTER COLUMN guild_id SET NOT NULL, ADD PRIMARY KEY (guild_id, game_code);
+            ALTER TABLE game_participants ALTER COLUMN guild_id SET NOT NULL,
+                ADD UNIQUE (guild_id, game_code, user_id),
+                ADD FOREIGN KEY (guild_id, game_code) REFERENCES games(guild_id, game_code) ON DELETE CASCADE;
+        """
+        if await self._execute_query(query, (self.legacy_guild_id or None,)):
+            self.logger.info("Clé des parties migrée vers (guild_id, game_code).")
+        else:
+            self.logger.error("Migration de la clé des parties impossible : des parties sans serveur existent et DISCORD_GUILD_ID est absent.")
+
+    # --- MÉTHODES POUR LA CONFIGURATION DES SERVEURS ---
+    async def get_guild_configs(self) -> list[dict]:
+        configs = await self._execute_query("SELECT * FROM guild_configs", fetch_all=True)
+        return [dict(c) for c in configs] if configs else []
+
+    async def upsert_guild_config(self, guild_id: int, data: dict):
+        columns = list(data.keys())
+        update_set_clause = ", ".join([f"{col} = EXCLUDED.{col}" for col in columns])
+        query = f"INSERT INTO guild_configs (guild_id, {', '.join(columns)}) VALUES (%s, {', '.join(['%s'] * len(columns))}) ON CONFLICT (guild_id) DO UPDATE SET {update_set_clause}, updated_at = NOW()"
+        await self._execute_query(query, (guild_id, *data.values()))
+
+    async def is_guild_creator(self, guild_id: int, user_id: int) -> bool:
+        row = await self._execute_query("SELECT 1 FROM guild_creators WHERE guild_id = %s AND user_id = %s", (guild_id, user_id), fetch_one=True)
+        return row is not None
+
+    async def add_guild_creator(self, guild_id: int, user_id: int):
+        await self._execute_query("INSERT INTO guild_creators (guild_id, user_id) VALUES (%s, %s) ON CONFLICT DO NOTHING", (guild_id, user_id))
+
+    async def remove_guild_creator(self, guild_id: int, user_id: int):
+        await self._execute_query("DELETE FROM guild_creators WHERE guild_id = %s AND user_id = %s", (guild_id, user_id))
+
     # --- MÉTHODES POUR LES JOUEURS ---
     async def get_player(self, discord_id: int) -> dict | None:
         player = await self._execute_query("SELECT * FROM players WHERE discord_id = %s", (discord_id,), fetch_one=True)
@@ -125,9 +230,13 @@ class DatabaseManager:
         players = await self._execute_query("SELECT * FROM players", fetch_all=True)
         return [dict(p) for p in players] if players else []
 
-    async def get_player_participations(self, player_id: int) -> list[dict]:
-        query = "SELECT gp.game_code, gp.has_won_game, g.created_at, g.mode FROM game_participants gp JOIN games g ON gp.game_code = g.game_code WHERE gp.user_id = %s ORDER BY g.created_at DESC"
-        participations = await self._execute_query(query, (player_id,), fetch_all=True)
+    async def get_player_participations(self, player_id: int, include_archived: bool = False) -> list[dict]:
+        query = "SELECT gp.guild_id, gp.game_code, gp.has_won_game, g.created_at, g.mode FROM game_participants gp JOIN games g ON gp.guild_id = g.guild_id AND gp.game_code = g.game_code WHERE gp.user_id = %s"
+        params = (player_id,)
+        if include_archived:
+            query += " UNION ALL SELECT ga.guild_id, ga.game_code, gpa.has_won_game, ga.created_at, ga.mode FROM game_participants_archive gpa JOIN games_archive ga ON gpa.archive_id = ga.id WHERE gpa.user_id = %s"
+            params = (player_id, player_id)
+        participations = await self._execute_query(query + " ORDER BY created_at DESC", params, fetch_all=True)
         return [dict(p) for p in participations] if participations else []
         
     async def upsert_player(self, discord_id: int, data: dict):
@@ -138,8 +247,8 @@ class DatabaseManager:
         await self._execute_query(query, params)
 
     # --- MÉTHODES POUR LES PARTIES ---
-    async def get_game(self, game_code: str) -> dict | None:
-        game = await self._execute_query("SELECT * FROM games WHERE game_code = %s", (game_code,), fetch_one=True)
+    async def get_game(self, guild_id: int, game_code: str) -> dict | None:
+        game = await self._execute_query("SELECT * FROM games WHERE guild_id = %s AND game_code = %s", (guild_id, game_code), fetch_one=True)
         return dict(game) if game else None
         
     async def get_all_games(self) -> list[dict]:
@@ -150,41 +259,102 @@ class DatabaseManager:
         games = await self._execute_query("SELECT * FROM games WHERE status IN ('pending', 'locked') ORDER BY created_at DESC", fetch_all=True)
         return [dict(g) for g in games] if games else []
 
-    async def create_game(self, **data):
+    async def create_game(self, **data) -> bool:
+        """Enregistre la partie. Renvoie False si l'insertion échoue (code déjà pris sur ce serveur, base indisponible)."""
         columns = list(data.keys())
-        query = f"INSERT INTO games ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        quoted_columns = ", ".join(f'"{col}"' for col in columns) # "limit" est un mot réservé SQL
+        query = f"INSERT INTO games ({quoted_columns}) VALUES ({', '.join(['%s'] * len(columns))})"
         params = tuple(data.values())
-        await self._execute_query(query, params)
+        return await self._execute_query(query, params)
         
-    async def update_game_status(self, game_code: str, status: str, winner_names: list = None):
+    async def update_game_status(self, guild_id: int, game_code: str, status: str, winner_names: list = None):
         if status == 'finished':
-            query = "UPDATE games SET status = %s, winner_epic_names = %s, end_time = NOW() WHERE game_code = %s"
-            params = (status, json.dumps(winner_names), game_code)
+            query = "UPDATE games SET status = %s, winner_epic_names = %s, end_time = NOW() WHERE guild_id = %s AND game_code = %s"
+            params = (status, json.dumps(winner_names), guild_id, game_code)
         else:
-            query = "UPDATE games SET status = %s, updated_at = NOW() WHERE game_code = %s"
-            params = (status, game_code)
+            query = "UPDATE games SET status = %s, updated_at = NOW() WHERE guild_id = %s AND game_code = %s"
+            params = (status, guild_id, game_code)
         await self._execute_query(query, params)
 
+    async def archive_finished_games(self, older_than_days: int, batch_size: int) -> int:
+        """Déplace un lot de parties terminées/annulées (et leurs participations) vers les tables d'archive. Renvoie le nombre de parties archivées."""
+        query = """
+            WITH batch AS (
+                SELECT guild_id, game_code FROM games
+                WHERE status IN ('finished', 'cancelled') AND COALESCE(end_time, created_at) < NOW() - %s * INTERVAL '1 day'
+                ORDER BY created_at LIMIT %s FOR UPDATE SKIP LOCKED
+            ), archived_games AS (
+                INSERT INTO games_archive (game_code, guild_id, creator_id, mode, status, winner_epic_names, participant_count, created_at, end_time)
+                SELECT g.game_code, g.guild_id, g.creator_id, g.mode, g.status, g.winner_epic_names,
+                       (SELECT COUNT(*) FROM game_participants gp WHERE gp.guild_id = g.guild_id AND gp.game_code = g.game_code), g.created_at, g.end_time
+                FROM games g JOIN batch b ON g.guild_id = b.guild_id AND g.game_code = b.game_code
+                RETURNING id, guild_id, game_code
+            ), archived_participants AS (
+                INSERT INTO game_participants_archive (archive_id, user_id, has_won_game)
+                SELECT ag.id, gp.user_id, gp.has_won_game
+                FROM game_participants gp JOIN archived_games ag ON gp.guild_id = ag.guild_id AND gp.game_code = ag.game_code
+            )
+            DELETE FROM games g USING archived_games ag WHERE g.guild_id = ag.guild_id AND g.game_code = ag.game_code RETURNING g.game_code
+        """
+        archived = await self._execute_query(query, (older_than_days, batch_size), fetch_all=True, commit=True)
+        return len(archived) if archived else 0
+
     # --- MÉTHODES POUR LES PARTICIPANTS ---
-    async def add_participant(self, game_code: str, user_id: int):
-        await self._execute_query("INSERT INTO game_participants (game_code, user_id) VALUES (%s, %s) ON CONFLICT DO NOTHING", (game_code, user_id))
+    async def add_participant(self, guild_id: int, game_code: str, user_id: int) -> bool:
+        return await self._execute_query("INSERT INTO game_participants (guild_id, game_code, user_id) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING", (guild_id, game_code, user_id))
+
+    async def add_participant_if_room(self, guild_id: int, game_code: str, user_id: int, limit: int) -> str:
+        """Inscription atomique sous verrou consultatif par partie. Renvoie 'joined', 'already', 'full' ou 'error' (base indisponible)."""
+        # Le verrou est pris dans une première instruction : la seconde voit donc les inscriptions des autres processus
+        query = """
+            SELECT pg_advisory_xact_lock(hashtext(%s));
+            WITH existing AS (
+                SELECT 1 FROM game_participants WHERE guild_id = %s AND game_code = %s AND user_id = %s
+            ), inserted AS (
+                INSERT INTO game_participants (guild_id, game_code, user_id)
+                SELECT %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM existing)
+                    AND (SELECT COUNT(*) FROM game_participants WHERE guild_id = %s AND game_code = %s) < %s
+                ON CONFLICT DO NOTHING RETURNING user_id
+            )
+            SELECT EXISTS (SELECT 1 FROM existing) AS already, EXISTS (SELECT 1 FROM inserted) AS joined
+        """
+        params = (f"{guild_id}:{game_code}", guild_id, game_code, user_id, guild_id, game_code, user_id, guild_id, game_code, limit)
+        result = await self._execute_query(query, params, fetch_one=True, commit=True)
+        if not result: return 'error'
+        return 'already' if result['already'] else 'joined' if result['joined'] else 'full'
+
+    async def remove_participant(self, guild_id: int, game_code: str, user_id: int) -> bool:
+        removed = await self._execute_query("DELETE FROM game_participants WHERE guild_id = %s AND game_code = %s AND user_id = %s RETURNING user_id", (guild_id, game_code, user_id), fetch_one=True, commit=True)
+        return removed is not None
+
+    async def has_participant(self, guild_id: int, game_code: str, user_id: int) -> bool:
+        row = await self._execute_query("SELECT 1 FROM game_participants WHERE guild_id = %s AND game_code = %s AND user_id = %s", (guild_id, game_code, user_id), fetch_one=True)
+        return row is not None
+
+    async def count_participants(self, guild_id: int, game_code: str) -> int:
+        row = await self._execute_query("SELECT COUNT(*) FROM game_participants WHERE guild_id = %s AND game_code = %s", (guild_id, game_code), fetch_one=True)
+        return row[0] if row else 0
     
-    async def get_game_participants(self, game_code: str) -> list[dict]:
+    async def get_game_participants(self, guild_id: int, game_code: str) -> list[dict]:
         query = """
             SELECT p.discord_id, p.epic_name, gp.has_won_game
             FROM game_participants gp
             JOIN players p ON gp.user_id = p.discord_id
-            WHERE gp.game_code = %s
+            WHERE gp.guild_id = %s AND gp.game_code = %s
         """
-        participants = await self._execute_query(query, (game_code,), fetch_all=True)
+        participants = await self._execute_query(query, (guild_id, game_code), fetch_all=True)
         return [dict(p) for p in participants] if participants else []
 
     # --- MÉTHODES POUR LES SANCTIONS ---
-    async def add_sanction(self, user_id: int, end_time: datetime, roles_json: str, sanction_type: str = "manual"):
-        await self._execute_query("INSERT INTO sanctions (user_id, sanction_type, end_time, roles_json) VALUES (%s, %s, %s, %s)", (user_id, sanction_type, end_time, roles_json))
+    async def add_sanction(self, user_id: int, guild_id: int, end_time: datetime, roles_json: str, sanction_type: str = "manual"):
+        await self._execute_query("INSERT INTO sanctions (user_id, guild_id, sanction_type, end_time, roles_json) VALUES (%s, %s, %s, %s, %s)", (user_id, guild_id, sanction_type, end_time, roles_json))
 
-    async def get_active_sanction(self, user_id: int) -> dict | None:
-        sanction = await self._execute_query("SELECT * FROM sanctions WHERE user_id = %s AND end_time > NOW() LIMIT 1", (user_id,), fetch_one=True)
+    async def get_active_sanction(self, user_id: int, guild_id: int | None = None) -> dict | None:
+        """Sanction active du joueur sur ce serveur (ou sur n'importe quel serveur si guild_id est None, pour l'API)."""
+        if guild_id is None:
+            sanction = await self._execute_query("SELECT * FROM sanctions WHERE user_id = %s AND end_time > NOW() LIMIT 1", (user_id,), fetch_one=True)
+        else:
+            sanction = await self._execute_query("SELECT * FROM sanctions WHERE user_id = %s AND guild_id = %s AND end_time > NOW() LIMIT 1", (user_id, guild_id), fetch_one=True)
         return dict(sanction) if sanction else None
 
     async def remove_sanction(self, sanction_id: uuid.UUID):
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# État partagé des parties actives et des inscrits (backends interchangeables)
+
+import logging
+
+def game_key_for(game_data: dict) -> tuple[int, str]:
+    """Clé d'une partie : les codes ne sont uniques qu'au sein d'un serveur."""
+    return (game_data['guild_id'], game_data['game_code'])
+
+class InMemoryGameStateStore:
+    """État des parties actives dans le processus, avec écriture des inscriptions en base.
+
+    Suffisant tant que chaque serveur n'est servi que par un seul processus (découpage par shard).
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.games = {}
+        self.message_index = {}
+        self.rosters = {}
+        self.logger = logging.getLogger('game_state')
+
+    async def load(self, guild_ids: set[int]):
+        """Rien à recharger : les parties en mémoire ne survivent pas à un redémarrage."""
+        return None
+
+    async def add_game(self, game_data: dict):
+        game_key = game_key_for(game_data)
+        self.games[game_key] = game_data
+        self.message_index[int(game_data['announce_message_id'])] = game_key
+        self.rosters[game_key] = set()
+
+    async def get_game(self, game_key: tuple[int, str]) -> dict | None:
+        return self.games.get(game_key)
+
+    async def get_game_by_message(self, message_id: int) -> dict | None:
+        game_key = self.message_index.get(message_id)
+        return self.games.get(game_key) if game_key else None
+
+    async def set_status(self, game_key: tuple[int, str], status: str):
+        if game_key in self.games: self.games[game_key]['status'] = status
+
+    async def remove_game(self, game_key: tuple[int, str]):
+        game_data = self.games.pop(game_key, None)
+        self.rosters.pop(game_key, None)
+        if game_data: self.message_index.pop(int(game_data['announce_message_id']), None)
+
+    async def add_participant(self, game_key: tuple[int, str], user_id: int, limit: int) -> str:
+        """Inscrit le joueur si la partie a de la place. Renvoie 'joined', 'already', 'full' ou 'error'."""
+        roster = self.rosters.setdefault(game_key, set())
+        if user_id in roster: return 'already'
+        if len(roster) >= limit: return 'full'
+        # Réservation avant le premier await : deux inscriptions simultanées ne peuvent pas dépasser la limite
+        roster.add(user_id)
+        if not await self.db_manager.add_participant(*game_key, user_id):
+            roster.discard(user_id)
+            return 'error'
+        return 'joined'
+
+    async def remove_participant(self, game_key: tuple[int, str], user_id: int) -> bool:
+        roster = self.rosters.get(game_key)
+        if not roster or user_id not in roster: return False
+        roster.discard(user_id)
+        await self.db_manager.remove_participant(*game_key, user_id)
+        return True
+
+    async def has_participant(self, game_key: tuple[int, str], user_id: int) -> bool:
+        return user_id in self.rosters.get(game_key, ())
+
+    async def participant_count(self, game_key: tuple[int, str]) -> int:
+        return len(self.rosters.get(game_key, ()))
+
+class PostgresGameStateStore(InMemoryGameStateStore):
+    """État des parties porté par Postgres : inscriptions et statuts sont lus en base et partagés entre processus.
+
+    Les inscriptions passent par un verrou consultatif (advisory lock) par partie, la limite est donc
+    respectée même si plusieurs processus traitent la même partie. Seul l'index message -> partie
+    reste local ; il est reconstruit au démarrage pour les serveurs servis par ce processus.
+    """
+    async def load(self, guild_ids: set[int]):
+        for game_data in await self.db_manager.get_active_games():
+            if game_data['guild_id'] in guild_ids:
+                await self.add_game(game_data)
+        self.logger.info(f"{len(self.games)} partie(s) active(s) rechargée(s) depuis la base.")
+
+    async def add_game(self, game_data: dict):
+        game_key = game_key_for(game_data)
+        self.games[game_key] = game_data
+        self.message_index[int(game_data['announce_message_id'])] = game_key
+
+    async def get_game(self, game_key: tuple[int, str]) -> dict | None:
+        game_data = await self.db_manager.get_game(*game_key)
+        if not game_data or game_data.get('status') not in ('pending', 'locked'): return None
+        return game_data
+
+    async def get_game_by_message(self, message_id: int) -> dict | None:
+        game_key = self.message_index.get(message_id)
+        return await self.get_game(game_key) if game_key else None
+
+    async def add_participant(self, game_key: tuple[int, str], user_id: int, limit: int) -> str:
+        return await self.db_manager.add_participant_if_room(*game_key, user_id, limit)
+
+    async def remove_participant(self, game_key: tuple[int, str], user_id: int) -> bool:
+        return await self.db_manager.remove_participant(*game_key, user_id)
+
+    async def has_participant(self, game_key: tuple[int, str], user_id: int) -> bool:
+        return await self.db_manager.has_participant(*game_key, user_id)
+
+    async def participant_count(self, game_key: tuple[int, str]) -> int:
+        return await self.db_manager.count_participants(*game_key)
+
+GAME_STATE_BACKENDS = {
+    "memory": InMemoryGameStateStore,
+    "postgres": PostgresGameStateStore,
+}
+
+def create_game_state_store(backend: str, db_manager):
+    store_class = GAME_STATE_BACKENDS.get(backend)
+    if not store_class:
+        raise ValueError(f"Backend d'état inconnu: '{backend}' (valeurs possibles: {', '.join(GAME_STATE_BACKENDS)})")
+    return store_class(db_manager)
@@ -4,9 +4,12 @@
 # ===================================================================================
 # --- 1. IMPORTS
 # ===================================================================================
+from time import perf_counter
+PROCESS_STARTED_AT = perf_counter() # Référence pour le rapport de temps de démarrage
+
 import discord
 from discord.ext import commands, tasks
-from discord import ui
+from discord import ui, app_commands
 from datetime import datetime, timedelta, timezone, time
 import asyncio
 import re
@@ -17,16 +20,11 @@ from collections import defaultdict
 import threading
 import uuid
 
-# Imports pour le serveur API
-from flask import Flask, jsonify, abort
-
-# Imports pour les APIs externes
-from googleapiclient.discovery import build as google_api_build
-from twitchAPI.twitch import Twitch
-from twitchAPI.helper import first as twitch_first
+# Flask (serveur API) et twitchAPI sont importés à la demande : ils ne ralentissent plus le chargement du bot.
 
 # --- IMPORTATION FINALE DE VOTRE GESTIONNAIRE DE BASE DE DONNÉES ---
 from database import DatabaseManager
+from game_state import create_game_state_store, game_key_for
 
 # ===================================================================================
 # --- 2. CONFIGURATION DU LOGGING
@@ -38,24 +36,46 @@ logger = logging.getLogger('discord_multiscrim_bot')
 # --- 3. CHARGEMENT DES VARIABLES D'ENVIRONNEMENT ET CONSTANTES
 # ===================================================================================
 TOKEN = os.environ.get("DISCORD_BOT_TOKEN")
+# Serveur historique : sa configuration par variables d'environnement sert de valeur par défaut et est recopiée en base
 GUILD_ID = int(os.environ.get("DISCORD_GUILD_ID", 0))
-ADMIN_PANEL_CHANNEL_ID = int(os.environ.get("ADMIN_PANEL_CHANNEL_ID", 0))
-LINK_PANEL_CHANNEL_ID = int(os.environ.get("LINK_PANEL_CHANNEL_ID", 0))
-RESULTS_CHANNEL_ID = int(os.environ.get("RESULTS_CHANNEL_ID", 0))
+ENV_GUILD_CONFIG = {
+    'admin_panel_channel_id': int(os.environ.get("ADMIN_PANEL_CHANNEL_ID", 0)),
+    'link_panel_channel_id': int(os.environ.get("LINK_PANEL_CHANNEL_ID", 0)),
+    'results_channel_id': int(os.environ.get("RESULTS_CHANNEL_ID", 0)),
+    'solo_announce_id': int(os.environ.get("SOLO_ANNOUNCE_ID", 0)),
+    'duo_announce_id': int(os.environ.get("DUO_ANNOUNCE_ID", 0)),
+    'trio_announce_id': int(os.environ.get("TRIO_ANNOUNCE_ID", 0)),
+}
+GAME_STATE_BACKEND = os.environ.get("GAME_STATE_BACKEND", "memory")
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", 0)) or None
+SHARD_IDS = [int(s) for s in os.environ.get("SHARD_IDS", "").split(",") if s.strip()] or None
 YOUTUBE_API_KEY = os.environ.get("YOUTUBE_API_KEY")
 TWITCH_CLIENT_ID = os.environ.get("TWITCH_CLIENT_ID")
 TWITCH_CLIENT_SECRET = os.environ.get("TWITCH_CLIENT_SECRET")
 
-if not all([TOKEN, GUILD_ID, ADMIN_PANEL_CHANNEL_ID, LINK_PANEL_CHANNEL_ID, RESULTS_CHANNEL_ID]):
-    logger.critical("ERREUR: Toutes les variables d'environnement (y compris RESULTS_CHANNEL_ID) doivent être définies.")
+if not TOKEN:
+    logger.critical("ERREUR: La variable d'environnement DISCORD_BOT_TOKEN doit être définie.")
+    exit()
+if SHARD_IDS and not SHARD_COUNT:
+    logger.critical("ERREUR: SHARD_COUNT doit être défini lorsque SHARD_IDS est utilisé.")
     exit()
 
-MODE_CHANNELS = {
-    "SOLO": {"announce_id": int(os.environ.get("SOLO_ANNOUNCE_ID", 0)), "emoji": "👤", "limit": 100},
-    "DUO":  {"announce_id": int(os.environ.get("DUO_ANNOUNCE_ID", 0)), "emoji": "👥", "limit": 50},
-    "TRIO": {"announce_id": int(os.environ.get("TRIO_ANNOUNCE_ID", 0)), "emoji": "👨‍👩‍👧", "limit": 33}
+MODE_SETTINGS = {
+    "SOLO": {"config_key": "solo_announce_id", "emoji": "👤", "limit": 100},
+    "DUO":  {"config_key": "duo_announce_id", "emoji": "👥", "limit": 50},
+    "TRIO": {"config_key": "trio_announce_id", "emoji": "👨‍👩‍👧", "limit": 33}
+}
+CONFIG_KEYS = {
+    "admin": "admin_panel_channel_id", "liaison": "link_panel_channel_id", "resultats": "results_channel_id",
+    "solo": "solo_announce_id", "duo": "duo_announce_id", "trio": "trio_announce_id",
 }
 BLOCKED_DURATION_MINUTES = 10
+EMBED_UPDATE_INTERVAL_SECONDS = 5
+REACTION_DEBOUNCE_SECONDS = 3
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 30))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 200))
+ARCHIVE_MAX_BATCHES_PER_RUN = 20
+ARCHIVE_INTERVAL_HOURS = 6
 
 # ===================================================================================
 # --- 4. INITIALISATION DU BOT, API ET CACHES
@@ -64,15 +84,17 @@ intents = discord.Intents.default()
 intents.members = True
 intents.reactions = True
 
-bot = commands.Bot(command_prefix=commands.when_mentioned_or("!"), intents=intents, help_command=None)
+bot = commands.AutoShardedBot(command_prefix=commands.when_mentioned_or("!"), intents=intents, help_command=None, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
 bot.db_manager = DatabaseManager()
+bot.game_store = create_game_state_store(GAME_STATE_BACKEND, bot.db_manager)
 bot.youtube_api_client = None
 bot.twitch_api_client = None
+bot.startup_report = {}
+bot.startup_done = False
 
-active_games = {}
-message_reactions = {}
-
-app = Flask(__name__)
+guild_configs = {GUILD_ID: dict(ENV_GUILD_CONFIG)} if GUILD_ID else {}
+announce_update_tasks = {}
+pending_leaves = {}
 
 # ===================================================================================
 # --- 5. ROUTES DE L'API (POUR LE SITE WEB)
@@ -85,51 +107,70 @@ def json_default_converter(o):
     raise TypeError(f"Object of type {o.__class__.__name__} is not JSON serializable")
 
 def to_json_response(data):
-    return app.response_class(
+    from flask import current_app
+    return current_app.response_class(
         response=json.dumps(data, default=json_default_converter, indent=4),
         mimetype='application/json'
     )
 
-@app.route('/api/games')
 async def get_games():
     games_data = await bot.db_manager.get_all_games()
     return to_json_response(games_data)
 
-@app.route('/api/games/<string:game_code>')
+def api_guild_id() -> int:
+    """Serveur visé par /api/games/<game_code> : paramètre ?guild_id=, sinon le serveur historique (DISCORD_GUILD_ID)."""
+    from flask import request
+    return request.args.get('guild_id', type=int) or GUILD_ID
+
 async def get_game_details_api(game_code):
-    game_data = await bot.db_manager.get_game(game_code)
+    game_data = await bot.db_manager.get_game(api_guild_id(), game_code)
     if game_data: return to_json_response(game_data)
-    return jsonify({"error": "Game not found"}), 404
+    return to_json_response({"error": "Game not found"}), 404
 
-@app.route('/api/games/<string:game_code>/participants')
 async def get_game_participants_api(game_code):
-    participants = await bot.db_manager.get_game_participants(game_code)
+    participants = await bot.db_manager.get_game_participants(api_guild_id(), game_code)
     return to_json_response(participants)
 
-@app.route('/api/players')
 async def get_players():
     players_data = await bot.db_manager.get_all_players()
     return to_json_response(players_data)
 
-@app.route('/api/players/<int:player_id>')
 async def get_player_details_api(player_id):
     player_data = await bot.db_manager.get_player(player_id)
     if player_data: return to_json_response(player_data)
-    return jsonify({"error": "Player not found"}), 404
+    return to_json_response({"error": "Player not found"}), 404
 
-@app.route('/api/players/<int:player_id>/participations')
 async def get_player_participations_api(player_id):
-    participations = await bot.db_manager.get_player_participations(player_id)
+    from flask import request
+    include_archived = request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+    participations = await bot.db_manager.get_player_participations(player_id, include_archived=include_archived)
     return to_json_response(participations)
 
-@app.route('/api/players/<int:player_id>/sanction')
 async def get_player_sanction_api(player_id):
     sanction = await bot.db_manager.get_active_sanction(player_id)
     return to_json_response({"active_sanction": sanction})
 
+API_ROUTES = [
+    ('/api/games', get_games),
+    ('/api/games/<string:game_code>', get_game_details_api),
+    ('/api/games/<string:game_code>/participants', get_game_participants_api),
+    ('/api/players', get_players),
+    ('/api/players/<int:player_id>', get_player_details_api),
+    ('/api/players/<int:player_id>/participations', get_player_participations_api),
+    ('/api/players/<int:player_id>/sanction', get_player_sanction_api),
+]
+
+def create_api_app():
+    """Construit l'application Flask de l'API ; Flask n'est importé qu'ici, dans le thread du serveur."""
+    from flask import Flask
+    app = Flask(__name__)
+    for rule, view_func in API_ROUTES:
+        app.add_url_rule(rule, view_func=view_func)
+    return app
+
 def run_flask_app():
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port)
+    create_api_app().run(host='0.0.0.0', port=port)
 
 # ===================================================================================
 # --- 6. FONCTIONS UTILITAIRES ET DE VÉRIFICATION
@@ -138,8 +179,7 @@ async def est_createur(interaction: discord.Interaction) -> bool:
     member = interaction.user
     if not isinstance(member, discord.Member): return False
     if member.guild_permissions.administrator: return True
-    player_data = await bot.db_manager.get_player(member.id)
-    return player_data and player_data.get('is_creator', False)
+    return await bot.db_manager.is_guild_creator(interaction.guild.id, member.id)
 
 async def est_admin(interaction: discord.Interaction) -> bool:
     return interaction.user.guild_permissions.administrator
@@ -153,6 +193,7 @@ async def find_member(guild: discord.Guild, identifier: str) -> discord.Member |
         
 async def obtenir_twitch_user_info(twitch_username: str) -> dict | None:
     if not bot.twitch_api_client or not isinstance(twitch_username, str): return None
+    from twitchAPI.helper import first as twitch_first
     cleaned_username = twitch_username.split('/')[-1]
     try:
         user_info = await twitch_first(bot.twitch_api_client.get_users(logins=[cleaned_username]))
@@ -167,6 +208,16 @@ async def get_initial_social_stats(player_id: int) -> str:
         return "Abos YT début: 124 (simulé)"
     return ""
 
+def get_guild_config(guild_id: int) -> dict:
+    return guild_configs.get(guild_id, {})
+
+def mode_channels_for(guild_id: int) -> dict:
+    config = get_guild_config(guild_id)
+    return {mode: {"announce_id": config.get(s["config_key"]) or 0, "emoji": s["emoji"], "limit": s["limit"]} for mode, s in MODE_SETTINGS.items()}
+
+def format_participant_count(count: int, limit: int) -> str:
+    return f"{count}/{limit} inscrits — {max(0, limit - count)} place(s) restante(s)"
+
 # ===================================================================================
 # --- 7. CLASSES D'INTERFACE UTILISATEUR (Modales & Vues)
 # ===================================================================================
@@ -277,7 +328,7 @@ class AdminPanelView(ui.View):
     @ui.button(label="Recréer Panel", style=discord.ButtonStyle.danger, emoji="♻️", custom_id="admin:recreate_panel", row=2)
     async def recreate_panel(self, interaction: discord.Interaction, button: ui.Button):
         await interaction.response.defer(ephemeral=True)
-        await send_or_recreate_admin_panel(interaction.channel)
+        await send_or_recreate_admin_panel(interaction.channel, force=True)
         await interaction.followup.send("✅ Panneau recréé.", ephemeral=True)
 
 # ===================================================================================
@@ -288,15 +339,20 @@ async def handle_start_game_logic(interaction: discord.Interaction, game_code: s
     game_code_processed = game_code.strip().lower()
     if not re.match(r"^[a-zA-Z0-9_.-]+$", game_code_processed):
         return await interaction.followup.send("⚠️ Le nom de la partie est invalide.", ephemeral=True)
-    if game_code_processed in active_games:
+    game_key = (interaction.guild.id, game_code_processed)
+    if await bot.game_store.get_game(game_key):
         return await interaction.followup.send(f"❌ Une partie avec le code `{game_code_processed}` est déjà active.", ephemeral=True)
+    # Les parties terminées ou annulées restent en base jusqu'à leur archivage : leur code n'est pas encore libre
+    if await bot.db_manager.get_game(*game_key):
+        return await interaction.followup.send(f"❌ Le code `{game_code_processed}` a déjà été utilisé récemment sur ce serveur, choisissez-en un autre.", ephemeral=True)
 
-    mode_emojis = [d["emoji"] for d in MODE_CHANNELS.values() if d.get("announce_id", 0) > 0]
+    mode_channels = mode_channels_for(interaction.guild.id)
+    mode_emojis = [d["emoji"] for d in mode_channels.values() if d.get("announce_id", 0) > 0]
     if not mode_emojis:
         return await interaction.followup.send("❌ Aucun mode de jeu n'a de salon d'annonce configuré.", ephemeral=True)
         
     embed_select = discord.Embed(title=f"🚀 Création Partie: `{game_code_processed}`", description=f"{interaction.user.mention}, choisissez le mode:", color=discord.Color.purple())
-    options_text = "\n".join([f"{d['emoji']} : **{m}**" for m, d in MODE_CHANNELS.items() if d.get("announce_id", 0) > 0])
+    options_text = "\n".join([f"{d['emoji']} : **{m}**" for m, d in mode_channels.items() if d.get("announce_id", 0) > 0])
     embed_select.add_field(name="Modes Disponibles", value=options_text)
     
     mode_select_msg = await interaction.channel.send(embed=embed_select, delete_after=60.0)
@@ -306,7 +362,7 @@ async def handle_start_game_logic(interaction: discord.Interaction, game_code: s
 
     try:
         reaction, user = await bot.wait_for('reaction_add', timeout=60.0, check=lambda r, u: u.id == interaction.user.id and r.message.id == mode_select_msg.id and str(r.emoji) in mode_emojis)
-        sel_mode, sel_details = next(((m, d) for m, d in MODE_CHANNELS.items() if str(reaction.emoji) == d["emoji"]), (None, None))
+        sel_mode, sel_details = next(((m, d) for m, d in mode_channels.items() if str(reaction.emoji) == d["emoji"]), (None, None))
     except asyncio.TimeoutError: 
         return
 
@@ -317,26 +373,89 @@ async def handle_start_game_logic(interaction: discord.Interaction, game_code: s
         logger.error(f"Salon d'annonce introuvable pour le mode {sel_mode} (ID: {sel_details['announce_id']})")
         return
     
-    link_panel_ch = interaction.guild.get_channel(LINK_PANEL_CHANNEL_ID)
-
-    embed_annonce = discord.Embed(title=f"Nouvelle Partie [{sel_mode}]: {game_code_processed}", color=discord.Color.blue(), timestamp=datetime.now(timezone.utc))
-    embed_annonce.add_field(name="Lancée par", value=interaction.user.mention, inline=False)
-    embed_annonce.add_field(name="Comment participer ?", value=f"1. Réagissez avec ✅ pour rejoindre (Limite: {sel_details['limit']}).\n2. Liez vos comptes via {link_panel_ch.mention} !", inline=False)
-    embed_annonce.add_field(name="Instructions Créateur", value=f"{interaction.user.mention} clique ▶️ pour démarrer (verrouiller les inscriptions), ou 🛑 pour annuler.", inline=False)
-    embed_annonce.set_footer(text=f"Limite totale joueurs: {sel_details['limit']}")
-    
-    ann_msg = await ann_ch.send(embed=embed_annonce)
+    game_data = {'game_code': game_code_processed, 'guild_id': interaction.guild.id, 'mode': sel_mode, 'creator_id': interaction.user.id, 'status': 'pending', 'limit': sel_details['limit'], 'created_at': datetime.now(timezone.utc)}
+    ann_msg = await ann_ch.send(embed=build_announce_embed(game_data, 0))
     for emoji in ["✅", "▶️", "🛑"]: await ann_msg.add_reaction(emoji)
 
-    game_data = {'game_code': game_code_processed, 'mode': sel_mode, 'creator_id': interaction.user.id, 'announce_message_id': ann_msg.id, 'announce_channel_id': ann_ch.id, 'status': 'pending', 'limit': sel_details['limit']}
-    await bot.db_manager.create_game(**game_data)
-    active_games[game_code_processed] = game_data
-    message_reactions[ann_msg.id] = game_code_processed
+    game_data.update({'announce_message_id': ann_msg.id, 'announce_channel_id': ann_ch.id})
+    if not await bot.db_manager.create_game(**game_data):
+        logger.error(f"Impossible d'enregistrer la partie '{game_code_processed}' en base, annonce retirée.")
+        try: await ann_msg.delete()
+        except discord.HTTPException: pass
+        return await interaction.followup.send(f"❌ La partie `{game_code_processed}` n'a pas pu être créée (code déjà utilisé ou base indisponible). Réessayez.", ephemeral=True)
+    await bot.game_store.add_game(game_data)
     logger.info(f"Partie '{game_code_processed}' créée par {interaction.user.name}.")
 
+def build_announce_embed(game_data: dict, participant_count: int) -> discord.Embed:
+    """Construit l'annonce à partir de l'état de la partie : aucune relecture du message n'est nécessaire pour l'éditer."""
+    locked = game_data.get('status') == 'locked'
+    limit = game_data.get('limit', 999)
+    creator_mention = f"<@{game_data['creator_id']}>"
+    embed = discord.Embed(title=f"Nouvelle Partie [{game_data['mode']}]: {game_data['game_code']}", color=discord.Color.red() if locked else discord.Color.blue(), timestamp=game_data.get('created_at'))
+    embed.add_field(name="Lancée par", value=creator_mention, inline=False)
+    if locked:
+        embed.add_field(name="Inscriptions fermées !", value="La partie va bientôt commencer.", inline=False)
+    else:
+        link_panel_ch = bot.get_channel(get_guild_config(game_data.get('guild_id')).get('link_panel_channel_id') or 0)
+        link_panel_mention = link_panel_ch.mention if link_panel_ch else "le panneau de liaison"
+        embed.add_field(name="Comment participer ?", value=f"1. Réagissez avec ✅ pour rejoindre (Limite: {limit}).\n2. Liez vos comptes via {link_panel_mention} !", inline=False)
+    embed.add_field(name="Instructions Créateur", value=f"{creator_mention} clique ▶️ pour démarrer (verrouiller les inscriptions), ou 🛑 pour annuler.", inline=False)
+    embed.add_field(name="Participants", value=format_participant_count(participant_count, limit), inline=False)
+    embed.set_footer(text=f"Limite totale joueurs: {limit}")
+    return embed
+
+def schedule_announce_update(game_key: tuple[int, str]):
+    """Planifie une mise à jour du compteur de l'annonce, regroupant toutes les inscriptions de l'intervalle."""
+    task = announce_update_tasks.get(game_key)
+    if task and not task.done(): return
+    announce_update_tasks[game_key] = asyncio.create_task(update_announce_embed(game_key))
+
+async def cancel_announce_update(game_key: tuple[int, str]):
+    """Annule la mise à jour en attente et attend sa fin : une édition déjà partie ne peut plus passer après la suivante."""
+    task = announce_update_tasks.pop(game_key, None)
+    if task and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+async def update_announce_embed(game_key: tuple[int, str]):
+    """Attend la fin de l'intervalle puis édite l'annonce une seule fois avec le nombre d'inscrits courant."""
+    await asyncio.sleep(EMBED_UPDATE_INTERVAL_SECONDS)
+    game_data = await bot.game_store.get_game(game_key)
+    if not game_data: return
+    try:
+        ann_ch = bot.get_channel(int(game_data['announce_channel_id']))
+        embed = build_announce_embed(game_data, await bot.game_store.participant_count(game_key))
+        await ann_ch.get_partial_message(int(game_data['announce_message_id'])).edit(embed=embed)
+    except Exception as e:
+        logger.error(f"Impossible de mettre à jour l'annonce de la partie {game_data['game_code']}: {e}")
+
+def cancel_pending_leave(game_key: tuple[int, str], user_id: int) -> bool:
+    """Annule un départ encore en attente (le joueur a remis ✅ pendant le délai). Renvoie True si un départ a été annulé."""
+    task = pending_leaves.pop((game_key, user_id), None)
+    if task and not task.done():
+        task.cancel()
+        return True
+    return False
+
+async def process_leave(game_key: tuple[int, str], user_id: int):
+    """Retire le joueur de la partie une fois le délai anti-rebond écoulé sans nouvelle réaction ✅."""
+    await asyncio.sleep(REACTION_DEBOUNCE_SECONDS)
+    pending_leaves.pop((game_key, user_id), None)
+    game_data = await bot.game_store.get_game(game_key)
+    # La partie a pu être verrouillée pendant le délai : le roster est alors figé
+    if not game_data or game_data.get('status') != 'pending': return
+    if not await bot.game_store.remove_participant(game_key, user_id): return
+    schedule_announce_update(game_key)
+
+    ann_ch = bot.get_channel(int(game_data['announce_channel_id']))
+    if ann_ch:
+        await ann_ch.send(f"👋 <@{user_id}> a quitté `{game_data['game_code']}` [{game_data['mode']}].", delete_after=10)
+    logger.info(f"Joueur {user_id} retiré de la partie '{game_data['game_code']}'.")
+
 async def handle_end_game_logic(interaction: discord.Interaction, game_code: str, winner_identifier: str):
     game_code = game_code.strip().lower()
-    game_data = active_games.get(game_code)
+    game_key = (interaction.guild.id, game_code)
+    game_data = await bot.game_store.get_game(game_key)
     if not game_data:
         return await interaction.followup.send(f"❌ La partie `{game_code}` n'est pas active.", ephemeral=True)
 
@@ -352,14 +471,17 @@ async def handle_end_game_logic(interaction: discord.Interaction, game_code: str
         winner_message = f"{winner.mention}{yt_link} - Epic: {epic_name}"
         winner_names_for_db.append(epic_name)
     
-    results_channel = interaction.guild.get_channel(RESULTS_CHANNEL_ID)
+    results_channel_id = get_guild_config(interaction.guild.id).get('results_channel_id') or 0
+    results_channel = interaction.guild.get_channel(results_channel_id)
     if results_channel:
         victory_embed = discord.Embed(title=f"🏆 Victoire Partie {game_code} [{game_data['mode']}] !", color=discord.Color.gold(), timestamp=datetime.now(timezone.utc))
         victory_embed.description = f"Félicitations à l'équipe gagnante :\n{winner_message}"
         await results_channel.send(embed=victory_embed)
     else:
-        logger.error(f"Salon des résultats (ID: {RESULTS_CHANNEL_ID}) introuvable.")
+        logger.error(f"Salon des résultats (ID: {results_channel_id}) introuvable pour le serveur {interaction.guild.id}.")
     
+    # Plus aucune édition regroupée ne doit partir vers l'annonce une fois celle-ci supprimée
+    await cancel_announce_update(game_key)
     try:
         ann_ch = interaction.guild.get_channel(int(game_data['announce_channel_id']))
         ann_msg = await ann_ch.fetch_message(int(game_data['announce_message_id']))
@@ -367,10 +489,8 @@ async def handle_end_game_logic(interaction: discord.Interaction, game_code: str
     except Exception as e:
         logger.error(f"Impossible de supprimer le message d'annonce pour {game_code}: {e}")
         
-    await bot.db_manager.update_game_status(game_code, 'finished', winner_names=winner_names_for_db)
-    active_games.pop(game_code, None)
-    if msg_id := game_data.get('announce_message_id'):
-        message_reactions.pop(int(msg_id), None)
+    await bot.db_manager.update_game_status(*game_key, 'finished', winner_names=winner_names_for_db)
+    await bot.game_store.remove_game(game_key)
         
     await interaction.followup.send(f"✅ La partie `{game_code}` est terminée et le résultat a été annoncé.", ephemeral=True)
 
@@ -386,7 +506,7 @@ async def handle_punish_logic(interaction: discord.Interaction, member_identifie
 
     roles_to_save = [{'id': r.id, 'name': r.name} for r in target.roles if not r.is_default() and not r.is_premium_subscriber() and not r.managed and target.guild.me.top_role > r]
     end_time = datetime.now(timezone.utc) + timedelta(minutes=BLOCKED_DURATION_MINUTES)
-    await bot.db_manager.add_sanction(target.id, end_time, json.dumps(roles_to_save))
+    await bot.db_manager.add_sanction(target.id, interaction.guild.id, end_time, json.dumps(roles_to_save))
 
     try:
         roles_to_remove = [r for r in target.roles if r.id in [role['id'] for role in roles_to_save]]
@@ -402,7 +522,7 @@ async def handle_unpunish_logic(interaction: discord.Interaction, member_identif
     if not target:
         return await interaction.followup.send("❌ Membre introuvable.", ephemeral=True)
     
-    sanction = await bot.db_manager.get_active_sanction(target.id)
+    sanction = await bot.db_manager.get_active_sanction(target.id, interaction.guild.id)
     if not sanction:
         return await interaction.followup.send(f"ℹ️ {target.mention} n'a pas de sanction active.", ephemeral=True)
 
@@ -423,41 +543,134 @@ async def handle_authorize_creator_logic(interaction: discord.Interaction, membe
     target = await find_member(interaction.guild, member_identifier)
     if not target or target.bot:
         return await interaction.followup.send("❌ Membre invalide ou bot.", ephemeral=True)
-    await bot.db_manager.upsert_player(target.id, {'is_creator': True})
+    await bot.db_manager.add_guild_creator(interaction.guild.id, target.id)
     await interaction.followup.send(f"✅ {target.mention} est maintenant un créateur de parties.", ephemeral=True)
 
 async def handle_revoke_creator_logic(interaction: discord.Interaction, member_identifier: str):
     target = await find_member(interaction.guild, member_identifier)
     if not target:
         return await interaction.followup.send("❌ Membre introuvable.", ephemeral=True)
-    await bot.db_manager.upsert_player(target.id, {'is_creator': False})
+    await bot.db_manager.remove_guild_creator(interaction.guild.id, target.id)
     await interaction.followup.send(f"➖ {target.mention} n'est plus un créateur de parties.", ephemeral=True)
 
 # ===================================================================================
 # --- 9. FONCTIONS DE DÉMARRAGE ET DE MAINTENANCE
 # ===================================================================================
-async def send_or_recreate_admin_panel(channel: discord.TextChannel):
-    try:
+def panel_matches(message: discord.Message, embed: discord.Embed, view: ui.View) -> bool:
+    if not message.embeds: return False
+    current = message.embeds[0]
+    current_ids = {getattr(c, 'custom_id', None) for row in message.components for c in getattr(row, 'children', [])}
+    expected_ids = {item.custom_id for item in view.children}
+    return current.title == embed.title and current.description == embed.description and current.color == embed.color and current_ids == expected_ids
+
+async def reconcile_panel(channel: discord.TextChannel, embed: discord.Embed, view: ui.View, force: bool = False) -> str:
+    """Réutilise le panneau déjà présent dans le salon (édité seulement s'il diffère) ; sinon purge et renvoie."""
+    bot_messages = [m async for m in channel.history(limit=20) if m.author == bot.user]
+    panel = next((m for m in bot_messages if m.embeds and m.embeds[0].title == embed.title), None)
+    if force or not panel:
         await channel.purge(limit=20, check=lambda m: m.author == bot.user)
+        await channel.send(embed=embed, view=view)
+        return "recréé"
+
+    # Restes d'anciens panneaux : une seule suppression groupée, comme l'ancien purge
+    if len(bot_messages) > 1:
+        await channel.purge(limit=20, check=lambda m: m.author == bot.user and m.id != panel.id)
+    if panel_matches(panel, embed, view):
+        return "inchangé"
+    await panel.edit(embed=embed, view=view)
+    return "mis à jour"
+
+async def send_or_recreate_admin_panel(channel: discord.TextChannel, force: bool = False):
+    try:
         embed = discord.Embed(title="🛠️ Panneau Administrateur", description="Actions rapides pour les créateurs de parties.", color=discord.Color.dark_red())
-        await channel.send(embed=embed, view=AdminPanelView())
-        logger.info(f"Panneau Admin recréé dans #{channel.name}.")
+        result = await reconcile_panel(channel, embed, AdminPanelView(), force=force)
+        logger.info(f"Panneau Admin {result} dans #{channel.name}.")
     except Exception as e:
         logger.error(f"Erreur lors de la recréation du Panneau Admin : {e}")
         
-async def send_or_recreate_link_panel(channel: discord.TextChannel):
+async def send_or_recreate_link_panel(channel: discord.TextChannel, force: bool = False):
     try:
-        await channel.purge(limit=20, check=lambda m: m.author == bot.user)
         embed = discord.Embed(title="🔗 Liaison Comptes & Epic", description="Cliquez pour lier/modifier vos comptes (Epic, YouTube, Twitch).\n**Obligatoire pour participer.**", color=discord.Color.blurple())
-        await channel.send(embed=embed, view=LinkPanelView())
-        logger.info(f"Panneau de liaison recréé dans #{channel.name}.")
+        result = await reconcile_panel(channel, embed, LinkPanelView(), force=force)
+        logger.info(f"Panneau de liaison {result} dans #{channel.name}.")
     except Exception as e:
         logger.error(f"Erreur lors de la recréation du Panneau de liaison : {e}")
 
+async def init_twitch_client():
+    if not (TWITCH_CLIENT_ID and TWITCH_CLIENT_SECRET): return
+    try:
+        from twitchAPI.twitch import Twitch
+        bot.twitch_api_client = await Twitch(TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, authenticate_app=True)
+        logger.info("Client API Twitch initialisé.")
+    except Exception as e:
+        logger.error(f"Erreur d'initialisation de l'API Twitch: {e}")
+
+async def timed_startup_step(name: str, coro):
+    """Exécute une étape du démarrage et consigne sa durée dans bot.startup_report."""
+    started_at = perf_counter()
+    try:
+        return await coro
+    finally:
+        bot.startup_report[name] = perf_counter() - started_at
+
+async def reconcile_panel_channel(channel_id: int, label: str, reconcile_func):
+    channel = bot.get_channel(channel_id)
+    if channel:
+        await reconcile_func(channel)
+    else:
+        logger.warning(f"Le canal du panneau {label} (ID: {channel_id}) est introuvable.")
+
+async def load_guild_configs():
+    """Charge la configuration de chaque serveur depuis la base ; celle du serveur historique y est recopiée si absente."""
+    stored_guild_ids = set()
+    for config in await bot.db_manager.get_guild_configs():
+        guild_id = config.pop('guild_id')
+        config.pop('updated_at', None)
+        stored_guild_ids.add(guild_id)
+        guild_configs[guild_id] = {**guild_configs.get(guild_id, {}), **{k: v for k, v in config.items() if v}}
+    env_config = {k: v for k, v in ENV_GUILD_CONFIG.items() if v}
+    if GUILD_ID and GUILD_ID not in stored_guild_ids and env_config:
+        await bot.db_manager.upsert_guild_config(GUILD_ID, env_config)
+    logger.info(f"Configuration chargée pour {len(guild_configs)} serveur(s).")
+
+async def init_database():
+    await bot.db_manager.connect()
+    await load_guild_configs()
+    await bot.game_store.load({g.id for g in bot.guilds})
+
+async def reconcile_guild_panels(guild: discord.Guild):
+    config = get_guild_config(guild.id)
+    await asyncio.gather(
+        reconcile_panel_channel(config.get('admin_panel_channel_id') or 0, "admin", send_or_recreate_admin_panel),
+        reconcile_panel_channel(config.get('link_panel_channel_id') or 0, "de liaison", send_or_recreate_link_panel),
+    )
+
+async def init_database_and_panels():
+    # Les panneaux dépendent de la configuration stockée en base
+    await timed_startup_step('base de données', init_database())
+    guilds = [g for g in (bot.get_guild(guild_id) for guild_id in list(guild_configs)) if g]
+    await timed_startup_step('panneaux', asyncio.gather(*(reconcile_guild_panels(g) for g in guilds)))
+
 async def load_persistent_views():
     bot.add_view(LinkPanelView())
     bot.add_view(AdminPanelView())
     logger.info("🔄 Vues persistantes enregistrées.")
+
+@tasks.loop(hours=ARCHIVE_INTERVAL_HOURS)
+async def archive_old_games():
+    """Archive par lots les parties terminées/annulées depuis plus de ARCHIVE_AFTER_DAYS jours."""
+    total = 0
+    for _ in range(ARCHIVE_MAX_BATCHES_PER_RUN):
+        archived = await bot.db_manager.archive_finished_games(ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
+        total += archived
+        if archived < ARCHIVE_BATCH_SIZE: break
+        await asyncio.sleep(1) # Laisse passer les requêtes du bot entre deux lots
+    if total:
+        logger.info(f"🗄️ {total} partie(s) archivée(s) (plus de {ARCHIVE_AFTER_DAYS} jours).")
+
+@archive_old_games.error
+async def archive_old_games_error(error: Exception):
+    logger.error(f"Erreur lors de l'archivage des parties: {error}")
     
 # ===================================================================================
 # --- 10. ÉVÉNEMENTS DU BOT (Events)
@@ -465,48 +678,47 @@ async def load_persistent_views():
 @bot.event
 async def on_ready():
     logger.info("-" * 40)
-    logger.info(f"🚀 Bot '{bot.user.name}' est PRÊT !")
-    target_guild = bot.get_guild(GUILD_ID)
-    if not target_guild:
-        return logger.critical(f"CRITIQUE: Serveur (GUILD ID: {GUILD_ID}) non trouvé !")
-    
-    # Initialisation des clients API
-    if TWITCH_CLIENT_ID and TWITCH_CLIENT_SECRET:
-        try:
-            bot.twitch_api_client = await Twitch(TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, authenticate_app=True)
-            logger.info("Client API Twitch initialisé.")
-        except Exception as e:
-            logger.error(f"Erreur d'initialisation de l'API Twitch: {e}")
+    logger.info(f"🚀 Bot '{bot.user.name}' est PRÊT ! (shards: {bot.shard_ids or 'tous'} / {bot.shard_count})")
 
-    await bot.db_manager.connect()
+    # on_ready est rappelé à chaque reconnexion à la gateway : l'initialisation et le rapport n'ont lieu qu'une fois
+    if bot.startup_done:
+        logger.info("🔁 Reconnexion à la gateway, initialisation déjà effectuée.")
+        return
+    bot.startup_done = True
+
+    ready_at = perf_counter()
+    bot.startup_report.clear()
+    bot.startup_report['avant on_ready'] = ready_at - PROCESS_STARTED_AT
     await load_persistent_views()
-    
-    admin_channel = target_guild.get_channel(ADMIN_PANEL_CHANNEL_ID)
-    if admin_channel:
-        logger.info("Vérification et recréation du panneau d'administration...")
-        await send_or_recreate_admin_panel(admin_channel)
-    else:
-        logger.warning(f"Le canal du panneau admin (ID: {ADMIN_PANEL_CHANNEL_ID}) est introuvable.")
-        
-    link_channel = target_guild.get_channel(LINK_PANEL_CHANNEL_ID)
-    if link_channel:
-        logger.info("Vérification et recréation du panneau de liaison...")
-        await send_or_recreate_link_panel(link_channel)
-    else:
-        logger.warning(f"Le canal du panneau de liaison (ID: {LINK_PANEL_CHANNEL_ID}) est introuvable.")
-        
-    logger.info(f"✅ Connecté au serveur: '{target_guild.name}'")
+
+    # Twitch d'un côté, base puis panneaux de chaque serveur de l'autre : initialisation en parallèle
+    await asyncio.gather(
+        timed_startup_step('twitch', init_twitch_client()),
+        init_database_and_panels(),
+    )
+    bot.startup_report['on_ready'] = perf_counter() - ready_at
+    bot.startup_report['total'] = perf_counter() - PROCESS_STARTED_AT
+    logger.info("⏱️ Démarrage: " + ", ".join(f"{step} {duration:.2f}s" for step, duration in bot.startup_report.items()))
+
+    if not archive_old_games.is_running():
+        archive_old_games.start()
+
+    logger.info(f"✅ Connecté à {len(bot.guilds)} serveur(s).")
     logger.info("-" * 40)
 
 @bot.event
 async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
     if payload.user_id == bot.user.id or not payload.guild_id: return
     
-    game_code = message_reactions.get(payload.message_id)
-    if not game_code: return
-
-    game_data = active_games.get(game_code)
+    game_data = await bot.game_store.get_game_by_message(payload.message_id)
     if not game_data: return
+    game_key = game_key_for(game_data)
+    code = game_data['game_code']
+
+    # Réaction ✅ remise pendant le délai anti-rebond, ou joueur déjà inscrit : rien à faire
+    if str(payload.emoji) == '✅':
+        if cancel_pending_leave(game_key, payload.user_id) or await bot.game_store.has_participant(game_key, payload.user_id):
+            return
     
     guild = bot.get_guild(payload.guild_id)
     member = guild.get_member(payload.user_id)
@@ -522,60 +734,106 @@ async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
     if payload.user_id == game_data['creator_id']:
         if str(payload.emoji) == '🛑':
             await ann_msg.delete()
-            active_games.pop(game_code, None)
-            message_reactions.pop(payload.message_id, None)
-            await bot.db_manager.update_game_status(game_code, 'cancelled')
-            logger.info(f"Partie '{game_code}' annulée par le créateur.")
+            await bot.game_store.remove_game(game_key)
+            await cancel_announce_update(game_key)
+            await bot.db_manager.update_game_status(*game_key, 'cancelled')
+            logger.info(f"Partie '{code}' annulée par le créateur.")
             return
 
         if str(payload.emoji) == '▶️':
+            await bot.game_store.set_status(game_key, 'locked')
             game_data['status'] = 'locked'
-            await bot.db_manager.update_game_status(game_code, 'locked')
-            embed = ann_msg.embeds[0]
-            embed.color = discord.Color.red()
-            embed.set_field_at(1, name="Inscriptions fermées !", value="La partie va bientôt commencer.", inline=False)
-            await ann_msg.edit(embed=embed)
-            logger.info(f"Partie '{game_code}' verrouillée par le créateur.")
+            await cancel_announce_update(game_key)
+            await bot.db_manager.update_game_status(*game_key, 'locked')
+            # L'édition de verrouillage porte aussi le compteur final : plus aucune mise à jour ne suit
+            await ann_msg.edit(embed=build_announce_embed(game_data, await bot.game_store.participant_count(game_key)))
+            logger.info(f"Partie '{code}' verrouillée par le créateur.")
             return
 
     # Logique pour les joueurs
     if str(payload.emoji) == '✅':
         player_data = await bot.db_manager.get_player(member.id)
         if not player_data or not player_data.get('epic_name'):
-            link_ch = guild.get_channel(LINK_PANEL_CHANNEL_ID)
+            link_ch = guild.get_channel(get_guild_config(guild.id).get('link_panel_channel_id') or 0)
+            link_mention = link_ch.mention if link_ch else "le panneau de liaison"
             try:
-                await member.send(f"⚠️ Pour pouvoir rejoindre la partie `{game_code}`, vous devez d'abord lier votre compte Epic via {link_ch.mention} !")
+                await member.send(f"⚠️ Pour pouvoir rejoindre la partie `{code}`, vous devez d'abord lier votre compte Epic via {link_mention} !")
             except discord.Forbidden:
                 pass # L'utilisateur a ses MP fermés, on ne peut rien faire de plus.
             await ann_msg.remove_reaction(payload.emoji, member)
             return
             
-        participants = await bot.db_manager.get_game_participants(game_code)
-        if any(p['user_id'] == member.id for p in participants): # Vérifie si le joueur est déjà inscrit
-            return # Ne rien faire s'il est déjà dans la liste
-            
         if game_data.get('status') == 'locked':
-            try: await member.send(f"Les inscriptions pour la partie `{game_code}` sont fermées.")
+            try: await member.send(f"Les inscriptions pour la partie `{code}` sont fermées.")
+            except discord.Forbidden: pass
+            await ann_msg.remove_reaction(payload.emoji, member)
+            return
+
+        # Vérification de la limite et inscription en une seule opération (atomique selon le backend d'état)
+        join_result = await bot.game_store.add_participant(game_key, member.id, game_data.get('limit', 999))
+        if join_result == 'already':
+            return # Ne rien faire s'il est déjà dans la liste
+
+        if join_result == 'full':
+            try: await member.send(f"La partie `{code}` est complète.")
             except discord.Forbidden: pass
             await ann_msg.remove_reaction(payload.emoji, member)
             return
 
-        if len(participants) >= game_data.get('limit', 999):
-            try: await member.send(f"La partie `{game_code}` est complète.")
+        if join_result == 'error':
+            # Échec côté base : la partie n'est pas forcément complète, le joueur peut simplement réessayer
+            logger.error(f"Inscription de {member.id} à la partie '{code}' non enregistrée (erreur base).")
+            try: await member.send(f"⚠️ Votre inscription à la partie `{code}` n'a pas pu être enregistrée. Remettez ✅ pour réessayer.")
             except discord.Forbidden: pass
             await ann_msg.remove_reaction(payload.emoji, member)
             return
             
-        await bot.db_manager.add_participant(game_code, member.id)
+        schedule_announce_update(game_key)
         
         # Confirmation publique et privée
-        await ann_ch.send(f"👍 {member.mention} a rejoint `{game_code}` [{game_data['mode']}] !", delete_after=10)
+        await ann_ch.send(f"👍 {member.mention} a rejoint `{code}` [{game_data['mode']}] !", delete_after=10)
         try:
             stats = await get_initial_social_stats(member.id)
-            await member.send(f"✅ Vous avez rejoint la partie `{game_code}` [{game_data['mode']}] ! {stats}")
+            await member.send(f"✅ Vous avez rejoint la partie `{code}` [{game_data['mode']}] ! {stats}")
         except discord.Forbidden:
             pass # L'utilisateur a ses MP fermés
 
+@bot.event
+async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
+    if payload.user_id == bot.user.id or not payload.guild_id: return
+    if str(payload.emoji) != '✅': return
+
+    game_data = await bot.game_store.get_game_by_message(payload.message_id)
+    if not game_data or game_data.get('status') != 'pending': return
+    game_key = game_key_for(game_data)
+    if not await bot.game_store.has_participant(game_key, payload.user_id): return
+
+    # Le départ n'est appliqué qu'après le délai : un retrait/ajout rapide ne touche ni la base ni Discord
+    key = (game_key, payload.user_id)
+    if key not in pending_leaves:
+        pending_leaves[key] = asyncio.create_task(process_leave(game_key, payload.user_id))
+
+@bot.event
+async def setup_hook():
+    # Enregistre la commande /config auprès de Discord (un seul appel, avant la connexion à la gateway)
+    await bot.tree.sync()
+
+@bot.tree.command(name="config", description="Configurer un salon du bot pour ce serveur.")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(cle="Salon à configurer", salon="Salon à utiliser")
+@app_commands.choices(cle=[app_commands.Choice(name=key, value=key) for key in CONFIG_KEYS])
+async def config_command(interaction: discord.Interaction, cle: app_commands.Choice[str], salon: discord.TextChannel):
+    if not await est_admin(interaction):
+        return await interaction.response.send_message("❌ Seuls les utilisateurs avec la permission 'Administrateur du serveur' peuvent utiliser cette commande.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    column = CONFIG_KEYS[cle.value]
+    guild_configs.setdefault(interaction.guild.id, {})[column] = salon.id
+    await bot.db_manager.upsert_guild_config(interaction.guild.id, {column: salon.id})
+    if column == 'admin_panel_channel_id': await send_or_recreate_admin_panel(salon)
+    if column == 'link_panel_channel_id': await send_or_recreate_link_panel(salon)
+    await interaction.followup.send(f"✅ `{cle.value}` configuré sur {salon.mention}.", ephemeral=True)
+
 # ===================================================================================
 # --- 11. BLOC DE LANCEMENT PRINCIPAL (AVEC SERVEUR API)
 # ===================================================================================